@@ -2,17 +2,27 @@
 # CLI for Project 6: compare two annotation releases (A vs B).
 
 import argparse
+import logging
 import os
 from pathlib import Path
 
-from annot_consistency.diff import build_entities, diff_entity
-from annot_consistency.gffutils_db import load_or_create_db
+from gffutils import FeatureDB
+
+from annot_consistency.diff import (
+    build_entities,
+    build_signatures,
+    count_diff,
+    diff_entity,
+    unchanged_subtrees,
+)
+from annot_consistency.gffutils_db import ensure_digests, load_or_create_db
 from annot_consistency.html import write_htmlreport
 from annot_consistency.io import (
     ensure_outdir,
     write_changes_tsv,
     write_genome_tracks,
     write_run_json,
+    write_summary_counts_tsv,
     write_summary_tsv,
 )
 from annot_consistency.logging_utils import logger
@@ -28,6 +38,12 @@ def parse_args(argv=None) -> argparse.Namespace:
     p.add_argument("releaseB", help="Annotation release B in GFF3 format")
     p.add_argument("outDir", nargs="?", default=default_outdir,
                    help=f"Directory for output files (default: {default_outdir})")
+    p.add_argument("--fast-ingest", action="store_true",
+                   help="Build new gffutils DBs in memory with relaxed pragmas and "
+                        "only the index the diff uses")
+    p.add_argument("--summary-only", action="store_true",
+                   help="Only write summary.tsv, run.json and the report (no changes.tsv "
+                        "or tracks)")
     return p.parse_args(argv)
 
 #validate input files
@@ -43,53 +59,19 @@ def validate_inputs(release_a: Path, release_b: Path) -> None:
         raise ValueError(f"releaseB must be a .gff or .gff3 file, got: {release_b.name}")
 
 
-def main(argv=None) -> None:
-    args = parse_args(argv)
-
-    release_a = Path(args.releaseA)
-    release_b = Path(args.releaseB)
-    outdir = Path(args.outDir)
-
-    #validate input files
-    validate_inputs(release_a, release_b)
-
-    # ensure outdir exists
-    ensure_outdir(str(outdir))
-
-    # prefix
-    rel_a = os.path.splitext(os.path.basename(str(release_a)))[0]
-    rel_b = os.path.splitext(os.path.basename(str(release_b)))[0]
-    prefix = f"{rel_a}_{rel_b}"
-
-    # logging setup
-    log_file = outdir / f"{prefix}_annot-consistency.log"
-    log = logger(str(log_file))
-    log.info("Starting gffacake annotation consistency tool")
-    log.info("releaseA=%s", release_a)
-    log.info("releaseB=%s", release_b)
-    log.info("outDir=%s", outdir)
-    log.info("prefix=%s", prefix)
-
-    # DBs stored in in outdir for reuse
-    db_path_a = outdir / f"{prefix}_releaseA.db"
-    db_path_b = outdir / f"{prefix}_releaseB.db"
-
-
-    # gffutils loading (load_or_create_db)
-    try:
-        log.info("Loading/creating gffutils DBs: %s and %s", db_path_a, db_path_b)
-        db_a, db_b = load_or_create_db(release_a, release_b, db_path_a, db_path_b)
-        log.info("Loaded DBs successfully")
-    except Exception:
-        log.exception("Failed to load/create gffutils databases")
-        raise RuntimeError("Could not load or create gffutils databases")
-
+def diff_and_write(db_a: FeatureDB, db_b: FeatureDB, skip: set[tuple[str, str]],
+                   outdir: Path, prefix: str, log: logging.Logger,
+                   ) -> tuple[str, dict[str, dict[str, int]]]:
+    '''
+    Full diff: builds entities and change records, writes changes.tsv, summary.tsv
+    and the genome browser tracks. Gives (summary_path, counts) for the report
+    '''
     # build entities
     log.info("Building entities for release A")
-    a_entities = build_entities(db_a)
+    a_entities = build_entities(db_a, skip)
 
     log.info("Building entities for release B")
-    b_entities = build_entities(db_b)
+    b_entities = build_entities(db_b, skip)
 
     # differentiating entities
     log.info("Differentiating entities (A vs B)")
@@ -130,6 +112,91 @@ def main(argv=None) -> None:
         log.exception("Failed writing genome tracks")
         raise RuntimeError("Could not write genome tracks")
 
+    return summary_result
+
+
+def summarise_counts(db_a: FeatureDB, db_b: FeatureDB, skip: set[tuple[str, str]],
+                     outdir: Path, prefix: str, log: logging.Logger,
+                     ) -> tuple[str, dict[str, dict[str, int]]]:
+    '''
+    --summary-only: counts changes from signatures alone (no ChangeRecords)
+    and writes summary.tsv. Gives (summary_path, counts) for the report
+    '''
+    log.info("Building signatures for releases A and B")
+    a_signatures = build_signatures(db_a, skip)
+    b_signatures = build_signatures(db_b, skip)
+
+    log.info("Counting changes (A vs B)")
+    counts = count_diff(a_signatures, b_signatures)
+    log.info(
+        "Totals: added=%d removed=%d changed=%d",
+        sum(c['added'] for c in counts.values()),
+        sum(c['removed'] for c in counts.values()),
+        sum(c['changed'] for c in counts.values()))
+
+    try:
+        log.info("Writing summary.tsv")
+        return write_summary_counts_tsv(str(outdir), counts, prefix)
+    except Exception:
+        log.exception("Failed writing summary.tsv")
+        raise RuntimeError("Could not write summary.tsv")
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+
+    release_a = Path(args.releaseA)
+    release_b = Path(args.releaseB)
+    outdir = Path(args.outDir)
+
+    #validate input files
+    validate_inputs(release_a, release_b)
+
+    # ensure outdir exists
+    ensure_outdir(str(outdir))
+
+    # prefix
+    rel_a = os.path.splitext(os.path.basename(str(release_a)))[0]
+    rel_b = os.path.splitext(os.path.basename(str(release_b)))[0]
+    prefix = f"{rel_a}_{rel_b}"
+
+    # logging setup
+    log_file = outdir / f"{prefix}_annot-consistency.log"
+    log = logger(str(log_file))
+    log.info("Starting gffacake annotation consistency tool")
+    log.info("releaseA=%s", release_a)
+    log.info("releaseB=%s", release_b)
+    log.info("outDir=%s", outdir)
+    log.info("prefix=%s", prefix)
+    log.info("fast_ingest=%s", args.fast_ingest)
+    log.info("summary_only=%s", args.summary_only)
+
+    # DBs stored in in outdir for reuse
+    db_path_a = outdir / f"{prefix}_releaseA.db"
+    db_path_b = outdir / f"{prefix}_releaseB.db"
+
+
+    # gffutils loading (load_or_create_db)
+    try:
+        log.info("Loading/creating gffutils DBs: %s and %s", db_path_a, db_path_b)
+        db_a, db_b = load_or_create_db(release_a, release_b, db_path_a, db_path_b,
+                                       fast_ingest=args.fast_ingest)
+        log.info("Loaded DBs successfully")
+    except Exception:
+        log.exception("Failed to load/create gffutils databases")
+        raise RuntimeError("Could not load or create gffutils databases")
+
+    # skip seqids/entity types whose stored digests match in both releases
+    digests_a, shared_a = ensure_digests(db_a)
+    digests_b, shared_b = ensure_digests(db_b)
+    skip, skipped_seqids = unchanged_subtrees(digests_a, digests_b, shared_a | shared_b)
+    log.info("Skipping %d unchanged seqids (%d unchanged seqid/type subtrees)",
+             len(skipped_seqids), len(skip))
+
+    if args.summary_only:
+        summary_result = summarise_counts(db_a, db_b, skip, outdir, prefix, log)
+    else:
+        summary_result = diff_and_write(db_a, db_b, skip, outdir, prefix, log)
 
     #  writing run.json
     try:
@@ -140,7 +207,9 @@ def main(argv=None) -> None:
             tool_version="1.0",
             release_a=str(release_a),
             release_b=str(release_b),
-            prefix=prefix)
+            prefix=prefix,
+            skipped_seqids=skipped_seqids,
+            summary_only=args.summary_only)
     except Exception:
         log.exception("Failed writing run.json")
         raise RuntimeError("Could not write run.json")
@@ -153,6 +222,7 @@ def main(argv=None) -> None:
             summary_result=summary_result,
             prefix=prefix,
             run_json_path=run_json_path,
+            summary_only=args.summary_only,
         )
         log.info("Wrote report: %s", report_path)
     except Exception:
@@ -1,8 +1,13 @@
-from collections.abc import Mapping
+import json
+from collections.abc import Iterator, Mapping
 
 import gffutils  # type: ignore[import-untyped]
 
-from annot_consistency.models import ChangeRecord, EntitySummary
+from annot_consistency.gffutils_db import seqid_digest
+from annot_consistency.models import ENTITY_TYPES, ChangeRecord, EntitySummary
+
+# Signature tuple as given by EntitySummary.signature()
+Signature = tuple[object, ...]
 
 
 def choose_entity_id(featuretype: str,
@@ -34,49 +39,159 @@ def choose_entity_id(featuretype: str,
     return f"{featuretype}|{seqid}:{start}-{end}:{strand}"      # final fallback if no id or parent
 
 
-def build_entities(db: gffutils.FeatureDB) -> dict[str, dict[str, EntitySummary]]:
+def entity_summary(feature: gffutils.Feature) -> EntitySummary:
+    """
+    Builds the immutable EntitySummary for one gffutils feature.
+    """
+    attrs = feature.attributes
+
+    entity_id = choose_entity_id(feature.featuretype, attrs, feature.seqid,
+                                feature.start, feature.end, feature.strand)
+
+    parent_id: str | None = None     # parent not guaranted
+    if "Parent" in attrs and attrs["Parent"]:
+        parent_id = ",".join(attrs["Parent"])
+
+    return EntitySummary(
+        entity_type = feature.featuretype,
+        entity_id = entity_id,
+        seqid = feature.seqid,
+        source = feature.source,
+        start = feature.start,
+        end = feature.end,
+        score = feature.score,
+        strand = feature.strand,
+        phase = feature.frame,
+        parent_id = parent_id,
+        attrs = {key: ",".join(value) for key, value in attrs.items()})
+
+
+def build_entities(db: gffutils.FeatureDB,
+                   skip: set[tuple[str, str]] | None = None,
+                   ) -> dict[str, dict[str, EntitySummary]]:
     """
     Read ONE GFF3 release file and build structure needed by
     diff_entity: entity_type -> entity_id -> EntitySummary
     Only keeps entity types: gene, mRNA, exon.
+    skip: (seqid, entity_type) pairs that are identical in both releases
+    (see unchanged_subtrees); their features are never read from the DB.
     """
     entities_feature_type: dict[str, dict[str, EntitySummary]] = {
-        "gene": {},
-        "mRNA": {},
-        "exon": {}
+        et: {} for et in ENTITY_TYPES
         }
     # entity types for current fixtures
 
-    for feature in db.all_features(order_by=("seqid", "start")):
+    if not skip:
+        features = db.all_features(order_by=("seqid", "start"))
+    else:
+        features = _features_outside(db, skip)
+
+    for feature in features:
         if feature.featuretype not in entities_feature_type:
             continue
 
-        attrs = feature.attributes
-
-        entity_id = choose_entity_id(feature.featuretype, attrs, feature.seqid,
-                                    feature.start, feature.end, feature.strand)
-
-        parent_id: str | None     # parent not guaranted
-        if "Parent" in attrs and attrs["Parent"]:
-            parent_id = ",".join(attrs["Parent"])
-
         # create immutable summary object for diffing; store it under its feature type
         # and stable entity_id key.
-        entities_feature_type[feature.featuretype][entity_id] = EntitySummary(
-            entity_type = feature.featuretype,
-            entity_id = entity_id,
-            seqid = feature.seqid,
-            source = feature.source,
-            start = feature.start,
-            end = feature.end,
-            score = feature.score,
-            strand = feature.strand,
-            phase = feature.frame,
-            parent_id = parent_id,
-            attrs = {key: ",".join(value) for key, value in attrs.items()})
+        summary = entity_summary(feature)
+        entities_feature_type[feature.featuretype][summary.entity_id] = summary
 
     return entities_feature_type
 
+
+def entity_signature(featuretype: str,
+                     seqid: str,
+                     start: int,
+                     end: int,
+                     strand: str,
+                     score: str,
+                     frame: str,
+                     attrs: Mapping[str, list[str]]) -> tuple[str, Signature]:
+    """
+    Gives (entity_id, signature) for one feature row without building an EntitySummary.
+    The signature has the same fields as EntitySummary.signature().
+    """
+    entity_id = choose_entity_id(featuretype, attrs, seqid, start, end, strand)
+    parents = attrs.get("Parent", [])
+    parent_id = ",".join(parents) if parents else None
+    return entity_id, (seqid, start, end, strand, parent_id, score, frame, score)
+
+
+def build_signatures(db: gffutils.FeatureDB,
+                     skip: set[tuple[str, str]] | None = None,
+                     ) -> dict[str, dict[str, Signature]]:
+    """
+    Lighter version of build_entities for counts-only diffs:
+    entity_type -> entity_id -> signature.
+    Reads the feature rows straight from SQLite instead of building gffutils
+    Features, which is where most of build_entities' time goes.
+    """
+    signatures: dict[str, dict[str, Signature]] = {et: {} for et in ENTITY_TYPES}
+    skip = skip or set()
+
+    # same seqid, start order as build_entities, so duplicated IDs keep the same row
+    seqids = [row[0] for row in db.conn.execute("SELECT DISTINCT seqid FROM features")]
+    for seqid in sorted(seqids):
+        featuretypes = [et for et in ENTITY_TYPES if (seqid, et) not in skip]
+        if not featuretypes:
+            continue
+        placeholders = ",".join("?" for _ in featuretypes)
+        rows = db.conn.execute(
+            "SELECT featuretype, start, end, strand, score, frame, attributes FROM features "
+            f"WHERE seqid = ? AND featuretype IN ({placeholders}) ORDER BY seqid, start",
+            (seqid, *featuretypes))
+        for featuretype, start, end, strand, score, frame, attributes in rows:
+            entity_id, signature = entity_signature(featuretype, seqid, start, end, strand,
+                                                    score, frame, json.loads(attributes))
+            signatures[featuretype][entity_id] = signature
+
+    return signatures
+
+
+def _features_outside(db: gffutils.FeatureDB,
+                      skip: set[tuple[str, str]]) -> Iterator[gffutils.Feature]:
+    """
+    Yields tracked features in seqid, start order, leaving out skipped
+    (seqid, entity_type) pairs.
+    """
+    for seqid in sorted(db.seqids()):
+        featuretypes = [et for et in ENTITY_TYPES if (seqid, et) not in skip]
+        if featuretypes:
+            # region() is unordered; keep all_features' seqid, start order so
+            # duplicated IDs keep the same (last) copy with and without skip
+            yield from sorted(db.region(seqid=seqid, featuretype=featuretypes),
+                              key=lambda f: f.start)
+
+
+def unchanged_subtrees(digests_a: dict[str, dict[str, str]],
+                       digests_b: dict[str, dict[str, str]],
+                       shared: set[tuple[str, str]] | None = None,
+                       ) -> tuple[set[tuple[str, str]], list[str]]:
+    """
+    Compares the per-seqid/per-type digests of two releases (see
+    gffutils_db.ensure_digests). Gives the (seqid, entity_type) pairs that are
+    identical in both releases and the seqids whose whole subtree is identical.
+    shared: pairs holding an entity ID that is on more than one seqid in either
+    release (also from gffutils_db.ensure_digests); skipping those could change which copy
+    of the ID build_entities keeps, so they are never skipped.
+    """
+    shared = shared or set()
+    skip: set[tuple[str, str]] = set()
+    skipped_seqids: list[str] = []
+
+    for seqid in sorted(digests_a.keys() & digests_b.keys()):
+        types_a = digests_a[seqid]
+        types_b = digests_b[seqid]
+        has_shared = any((seqid, et) in shared for et in types_a.keys() | types_b.keys())
+        if not has_shared and seqid_digest(types_a) == seqid_digest(types_b):
+            skipped_seqids.append(seqid)
+            skip.update((seqid, et) for et in types_a)
+            continue
+        for et in types_a.keys() & types_b.keys():
+            if types_a[et] == types_b[et] and (seqid, et) not in shared:
+                skip.add((seqid, et))
+
+    return skip, skipped_seqids
+
 # Writing function for checking through each attribute in the signature if they are different
 def changed_details(a: EntitySummary, b: EntitySummary) -> str:
     '''
@@ -122,7 +237,7 @@ def diff_entity(a_entities: dict[str, dict[str, EntitySummary]],
     removed: list[EntitySummary] = []
     changed: list[EntitySummary] = []
 
-    for entity_type in ('gene', 'mRNA', 'exon'):
+    for entity_type in ENTITY_TYPES:
         a_map = a_entities.get(entity_type, {})
         b_map = b_entities.get(entity_type, {})
 
@@ -165,3 +280,27 @@ def diff_entity(a_entities: dict[str, dict[str, EntitySummary]],
                     )
 
     return changes, added, removed, changed
+
+
+def count_diff(a_signatures: dict[str, dict[str, Signature]],
+               b_signatures: dict[str, dict[str, Signature]]) -> dict[str, dict[str, int]]:
+    '''
+    Counts-only version of diff_entity: gives the added/removed/changed counts per
+    entity type (as io.count_changes does for the change records) using set sizes and
+    signature comparisons, without building ChangeRecords
+    '''
+    counts: dict[str, dict[str, int]] = {}
+
+    for entity_type in ENTITY_TYPES:
+        a_map = a_signatures.get(entity_type, {})
+        b_map = b_signatures.get(entity_type, {})
+
+        added = len(b_map.keys() - a_map.keys())
+        removed = len(a_map.keys() - b_map.keys())
+        changed = sum(1 for e_id in a_map.keys() & b_map.keys() if a_map[e_id] != b_map[e_id])
+
+        # like count_changes, only entity types with at least one change are listed
+        if added or removed or changed:
+            counts[entity_type] = {'added': added, 'removed': removed, 'changed': changed}
+
+    return counts
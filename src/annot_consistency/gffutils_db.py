@@ -1,33 +1,281 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
 import gffutils
 from gffutils import FeatureDB
 
-#Function to load the pre-existing database or create one for gff files
-# If DB exists, it connects to it
-# If DB does not exist, it creates a DB using the gff file
+from annot_consistency.models import ENTITY_TYPES
 
-def load_or_create_db(
-    gff_file_a: Path,
-    gff_file_b: Path,
-    db_path_a: Path,
-    db_path_b: Path) -> tuple[FeatureDB, FeatureDB]:
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+log = logging.getLogger("gffACAKE")
+
+# Relaxed pragmas for the fast-ingest profile; the DB is built in memory and
+# only written to disk once complete, so there is no need for a journal or fsyncs
+FAST_INGEST_PRAGMAS = {
+    "synchronous": "OFF",
+    "journal_mode": "OFF",
+    "temp_store": "MEMORY",
+    "main.page_size": 4096,
+    "main.cache_size": 10000,
+}
+
+
+# Indexes create_db builds that build_entities never uses; it only needs
+# seqidstartend for all_features(order_by=("seqid", "start"))
+UNUSED_INDEXES = ("relationsparent", "relationschild", "featuretype",
+                  "seqidstartendstrand", "binindex")
+
+
+def fast_create_db(gff_file: Path, db_path: Path) -> FeatureDB:
+    '''
+    Builds the gffutils DB in memory with relaxed pragmas and no keep_order bookkeeping,
+    drops the relations and indexes the diff does not use, then backs it up to db_path
+    '''
+    db = gffutils.create_db(str(gff_file), dbfn=":memory:", keep_order=False,
+                            merge_strategy="create_unique", pragmas=FAST_INGEST_PRAGMAS)
+    conn = db.conn
+    for index in UNUSED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    # create_db always infers relations, but the diff never reads them
+    conn.execute("DELETE FROM relations")
+    conn.commit()
+    # reclaim the dropped index and relation pages so the backup copies a compact DB
+    conn.execute("VACUUM")
+
+    disk = sqlite3.connect(str(db_path))
+    try:
+        conn.backup(disk)
+    finally:
+        disk.close()
+        conn.close()
+
+    return gffutils.FeatureDB(str(db_path))
+
+
+def compute_digests(db: FeatureDB) -> tuple[dict[str, dict[str, str]], set[tuple[str, str]]]:
+    '''
+    Hashes every tracked feature row (gene, mRNA, exon) into one sha256 digest per
+    seqid and entity type: seqid -> entity_type -> hex digest.
+    Also gives the shared (seqid, entity_type) pairs: those holding an entity ID
+    (the GFF3 ID= used by build_entities) that appears on more than one seqid
+    '''
+    placeholders = ",".join("?" for _ in ENTITY_TYPES)
+    rows = db.conn.execute(
+        "SELECT seqid, featuretype, id, source, start, end, score, strand, frame, attributes "
+        f"FROM features WHERE featuretype IN ({placeholders}) "
+        "ORDER BY seqid, featuretype, id", ENTITY_TYPES)
+
+    hashers: dict[str, dict[str, hashlib._Hash]] = {}
+    id_seqids: dict[tuple[str, str], set[str]] = {}
+    for row in rows:
+        seqid, featuretype = row[0], row[1]
+        hasher = hashers.setdefault(seqid, {}).setdefault(featuretype, hashlib.sha256())
+        hasher.update("\t".join(str(v) for v in row[2:]).encode())
+        hasher.update(b"\n")
+
+        entity_ids = json.loads(row[-1]).get("ID", [])
+        if entity_ids:
+            id_seqids.setdefault((featuretype, entity_ids[0]), set()).add(seqid)
+
+    digests = {seqid: {ft: h.hexdigest() for ft, h in by_type.items()}
+               for seqid, by_type in hashers.items()}
+    shared = {(seqid, featuretype)
+              for (featuretype, _), seqids in id_seqids.items() if len(seqids) > 1
+              for seqid in seqids}
+    return digests, shared
+
+
+def seqid_digest(type_digests: dict[str, str]) -> str:
+    '''
+    Merkle root for one seqid: hash of its per-type digests
+    '''
+    hasher = hashlib.sha256()
+    for featuretype in sorted(type_digests):
+        hasher.update(f"{featuretype}:{type_digests[featuretype]}\n".encode())
+    return hasher.hexdigest()
+
+
+def store_digests(db: FeatureDB) -> None:
+    '''
+    Computes the digests and shared pairs (see compute_digests) and stores them
+    in the release DB; called once by build_release_db, while the DB is built
+    '''
+    digests, shared = compute_digests(db)
+    conn = db.conn
+    conn.execute("CREATE TABLE gffacake_digests "
+                 "(seqid TEXT, featuretype TEXT, digest TEXT, shared INTEGER, "
+                 "PRIMARY KEY (seqid, featuretype))")
+    conn.executemany("INSERT INTO gffacake_digests VALUES (?, ?, ?, ?)",
+                     ((seqid, ft, digest, int((seqid, ft) in shared))
+                      for seqid, by_type in digests.items()
+                      for ft, digest in by_type.items()))
+    conn.commit()
 
+
+def ensure_digests(db: FeatureDB) -> tuple[dict[str, dict[str, str]], set[tuple[str, str]]]:
+    '''
+    Loads the per-seqid/per-type digests and shared pairs stored in the release DB
+    by store_digests; same shape as compute_digests
+    '''
+    digests: dict[str, dict[str, str]] = {}
+    shared: set[tuple[str, str]] = set()
+    for seqid, featuretype, digest, is_shared in db.conn.execute(
+            "SELECT seqid, featuretype, digest, shared FROM gffacake_digests"):
+        digests.setdefault(seqid, {})[featuretype] = digest
+        if is_shared:
+            shared.add((seqid, featuretype))
+    return digests, shared
+
+
+def source_stamp(gff_file: Path) -> tuple[int, int]:
+    '''
+    Identifies one version of a GFF file: (mtime in ns, size in bytes)
+    '''
+    stat = gff_file.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def mark_complete(db: FeatureDB, stamp: tuple[int, int]) -> None:
+    '''
+    Records in the DB that it was fully built, and from which version of the GFF
+    file (stamp from source_stamp); written last, before the DB is renamed into place
+    '''
+    db.conn.execute("CREATE TABLE IF NOT EXISTS gffacake_build "
+                    "(complete INTEGER, source_mtime_ns INTEGER, source_size INTEGER)")
+    db.conn.execute("INSERT INTO gffacake_build VALUES (1, ?, ?)", stamp)
+    db.conn.commit()
+
+
+def is_complete(db_path: Path, gff_file: Path | None = None) -> bool:
+    '''
+    True if db_path exists and carries the completeness marker from mark_complete;
+    if gff_file is given, the marker must also match its current source_stamp
+    '''
+    if not db_path.is_file():
+        return False
+    try:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return False
     try:
-        db_a = gffutils.FeatureDB(str(db_path_a))
+        row = conn.execute("SELECT complete, source_mtime_ns, source_size "
+                           "FROM gffacake_build").fetchone()
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+    if row is None or row[0] != 1:
+        return False
+    return gff_file is None or tuple(row[1:]) == source_stamp(gff_file)
+
 
-    except ValueError:
-        db_a = gffutils.create_db(str(gff_file_a), dbfn = str(db_path_a),
-                                  keep_order = True, merge_strategy="create_unique" )
+@contextmanager
+def file_lock(lock_path: Path) -> Iterator[None]:
+    '''
+    Holds an exclusive advisory lock on lock_path, blocking until it is free
+    '''
+    with open(lock_path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            # msvcrt.LK_LOCK gives up after ~10 seconds, so keep retrying
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
 
 
+def build_release_db(gff_file: Path, db_path: Path, fast_ingest: bool = False) -> None:
+    '''
+    Builds the release DB (with digests and completeness marker) into a temp file
+    next to db_path, then atomically renames it into place, replacing any older build
+    '''
+    # stamped before reading the file, so an edit during the build forces a rebuild
+    stamp = source_stamp(gff_file)
+    tmp_path = db_path.with_name(f"{db_path.name}.{os.getpid()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
     try:
-        db_b = gffutils.FeatureDB(str(db_path_b))
+        if fast_ingest:
+            db = fast_create_db(gff_file, tmp_path)
+        else:
+            db = gffutils.create_db(str(gff_file), dbfn = str(tmp_path),
+                                    keep_order = True, merge_strategy="create_unique")
+        try:
+            store_digests(db)
+            mark_complete(db, stamp)
+        finally:
+            db.conn.close()
+        os.replace(tmp_path, db_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
 
-    except ValueError:
-       db_b = gffutils.create_db(str(gff_file_b), dbfn = str(db_path_b),
-                                 keep_order = True, merge_strategy="create_unique")
 
+#Function to load the pre-existing database or create one for one gff file
+# If a complete DB built from the current version of the gff file exists, it connects to it
+# If not (missing, partial, or the gff file was edited since), it builds the DB from
+# the gff file under a file lock (build_release_db), replacing the old DB in place,
+# so concurrent jobs sharing an outdir build it once and reuse it
+# fast_ingest=True uses fast_create_db instead of the default create_db call
+# Per-seqid digests are stored in the DB (store_digests) so diffs can skip
+# unchanged chromosomes
 
-    return db_a, db_b
+def load_or_create_release_db(
+    gff_file: Path,
+    db_path: Path,
+    fast_ingest: bool = False) -> FeatureDB:
 
+    # finished DBs are reused without taking the lock
+    if not is_complete(db_path, gff_file):
+        lock_path = db_path.with_name(db_path.name + ".lock")
+        wait_start = time.perf_counter()
+        with file_lock(lock_path):
+            log.info("Waited %.2fs for DB lock %s",
+                     time.perf_counter() - wait_start, lock_path)
+            # another job may have finished the DB while we waited
+            if is_complete(db_path, gff_file):
+                log.info("Reusing DB built by another job: %s", db_path)
+            else:
+                log.info("Building DB %s", db_path)
+                build_release_db(gff_file, db_path, fast_ingest)
+
+    return gffutils.FeatureDB(str(db_path))
+
+
+# Loads or creates the DBs for both releases (A and B)
+
+def load_or_create_db(
+    gff_file_a: Path,
+    gff_file_b: Path,
+    db_path_a: Path,
+    db_path_b: Path,
+    fast_ingest: bool = False) -> tuple[FeatureDB, FeatureDB]:
+
+    db_a = load_or_create_release_db(gff_file_a, db_path_a, fast_ingest)
+    db_b = load_or_create_release_db(gff_file_b, db_path_b, fast_ingest)
+
+    return db_a, db_b
@@ -38,13 +38,16 @@ def write_htmlreport(outdir: str,
                     summary_result: tuple[str, dict[str, dict[str, int]]],
                     prefix: str,
                     run_json_path: str,
-                    title: str = 'Two release annotation consistency report') -> str:
+                    title: str = 'Two release annotation consistency report',
+                    summary_only: bool = False) -> str:
     '''
     Generate report.html and report.png. Takes in outdir: output directory,
     changes: ChangeRecord list from diff stage
     (taken from counts in io, used in cli), summary_result: (summary_path, counts)
     returned by io.write_summary_tsv(),
     run_json_path: path returned by io.write_run_json() and a title: HTML title.
+    summary_only: leave out the track links and the changes.tsv table (not written
+    in --summary-only mode).
     '''
     _, counts = summary_result
     plot_counts(outdir, counts, prefix)
@@ -121,12 +124,29 @@ def write_htmlreport(outdir: str,
 
     html.append("<h2>Artefacts</h2>")
     html.append("<ul>")
-    html.append(f"<li><a href='{prefix}_added.gff3'>{prefix}_added.gff3</a></li>")
-    html.append(f"<li><a href='{prefix}_removed.gff3'>{prefix}_removed.gff3</a></li>")
-    html.append(f"<li><a href='{prefix}_changed.gff3'>{prefix}_changed.gff3</a></li>")
+    if not summary_only:
+        html.append(f"<li><a href='{prefix}_added.gff3'>{prefix}_added.gff3</a></li>")
+        html.append(f"<li><a href='{prefix}_removed.gff3'>{prefix}_removed.gff3</a></li>")
+        html.append(f"<li><a href='{prefix}_changed.gff3'>{prefix}_changed.gff3</a></li>")
     html.append(f"<li><a href='{prefix}_run.json'>{prefix}_run.json</a></li>")
     html.append("</ul>")
 
+    if not summary_only:
+        _append_changes_table(html, outdir, prefix)
+    html.append("</body></html>")
+
+    report_path = os.path.join(outdir, f"{prefix}_report.html")
+    with open(report_path, "w", encoding="utf-8") as fh:
+        fh.write("\n".join(html))
+        fh.write("\n")
+
+    return report_path
+
+
+def _append_changes_table(html: list[str], outdir: str, prefix: str) -> None:
+    '''
+    Appends the collapsible changes.tsv table to the report
+    '''
     html.append("<h2>Detailed changes</h2>")
     html.append("<details>")
     html.append(f"<summary>Show {prefix}_changes.tsv table</summary>")
@@ -144,11 +164,3 @@ def write_htmlreport(outdir: str,
         html.append("</table>")
         html.append("</div>")
     html.append("</details>")
-    html.append("</body></html>")
-
-    report_path = os.path.join(outdir, f"{prefix}_report.html")
-    with open(report_path, "w", encoding="utf-8") as fh:
-        fh.write("\n".join(html))
-        fh.write("\n")
-
-    return report_path
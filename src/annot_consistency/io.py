@@ -13,6 +13,15 @@ def ensure_outdir(outdir: str) -> None:
     '''
     os.makedirs(outdir, exist_ok=True)
 
+# Column names of changes.tsv; also used as keys for change records served as JSON
+CHANGES_COLUMNS = ('Entity_Type', 'Entity_ID', 'Change_Type', 'Details')
+
+def change_row(c: ChangeRecord) -> tuple[str, str, str, str]:
+    '''
+    Gives one changes.tsv row (in CHANGES_COLUMNS order) for a change record
+    '''
+    return (c.entity_type, c.entity_id, c.change_type, c.details)
+
 # Writing function to be used in cli.py to write changes.tsv file
 def write_changes_tsv(outdir: str, changes: list[ChangeRecord], prefix: str) -> str:
     '''
@@ -23,19 +32,14 @@ def write_changes_tsv(outdir: str, changes: list[ChangeRecord], prefix: str) ->
     path = os.path.join(outdir, f'{prefix}_changes.tsv')
     # Using encoding for making sure it works on Windows/mac/Linux
     with open(path, 'w', encoding = 'utf-8') as handle:
-        handle.write('Entity_Type\tEntity_ID\tChange_Type\tDetails\n')
+        handle.write('\t'.join(CHANGES_COLUMNS) + '\n')
         for c in changes:
-            handle.write(f'{c.entity_type}\t{c.entity_id}\t{c.change_type}\t{c.details}\n')
+            handle.write('\t'.join(change_row(c)) + '\n')
     return path
 
-# Writing function to be used in cli.py to write summary.tsv file
-def write_summary_tsv(outdir: str,
-                    changes: list[ChangeRecord],
-                    prefix: str,) -> tuple[str, dict[str, dict[str, int]]]:
+def count_changes(changes: list[ChangeRecord]) -> dict[str, dict[str, int]]:
     '''
-    Gives the counts for number of changes by entity type and
-    the type of changes along with the total number of
-    changes (addition and removals included) for that entity
+    Gives the number of added, removed and changed records per entity type
     '''
     counts: dict[str, dict[str, int]] = {}
     for c in changes:
@@ -44,7 +48,26 @@ def write_summary_tsv(outdir: str,
             counts[et] = {'added': 0, 'removed': 0, 'changed': 0}
         if c.change_type in counts[et]:
             counts[et][c.change_type] += 1
+    return counts
 
+# Writing function to be used in cli.py to write summary.tsv file
+def write_summary_tsv(outdir: str,
+                    changes: list[ChangeRecord],
+                    prefix: str,) -> tuple[str, dict[str, dict[str, int]]]:
+    '''
+    Gives the counts for number of changes by entity type and
+    the type of changes along with the total number of
+    changes (addition and removals included) for that entity
+    '''
+    return write_summary_counts_tsv(outdir, count_changes(changes), prefix)
+
+# Writing function for summary.tsv from precomputed counts (used by --summary-only)
+def write_summary_counts_tsv(outdir: str,
+                             counts: dict[str, dict[str, int]],
+                             prefix: str,) -> tuple[str, dict[str, dict[str, int]]]:
+    '''
+    Writes summary.tsv from counts: entity type -> {added, removed, changed}
+    '''
     path = os.path.join(outdir, f'{prefix}_summary.tsv')
     with open(path, 'w', encoding = 'utf-8') as file:
         file.write('Entity_Type\tAdded\tRemoved\tChanged\tTotal\n')
@@ -111,9 +134,13 @@ def write_run_json(tool_name: str,
                    release_a: str,
                    release_b: str,
                    outdir: str,
-                   prefix: str) -> str:
+                   prefix: str,
+                   skipped_seqids: list[str] | None = None,
+                   summary_only: bool = False) -> str:
     '''
-    Gives a record of tool metadata, timestamp, inputs used and the output filenames
+    Gives a record of tool metadata, timestamp, inputs used and the output filenames,
+    plus the seqids skipped because their digests matched in both releases.
+    With summary_only, changes.tsv and the tracks are not listed as they are not written
     '''
     path = os.path.join(outdir, f'{prefix}_run.json')
     payload: dict[str, Any] = {
@@ -136,9 +163,18 @@ def write_run_json(tool_name: str,
             'summary_tsv': f'{prefix}_summary.tsv',
             'report_html': f'{prefix}_report.html',
             'report_png': f'{prefix}_report.png'
+        },
+        'skipped_seqids': {
+            'count': len(skipped_seqids or []),
+            'seqids': list(skipped_seqids or [])
         }
     }
 
+    payload['summary_only'] = summary_only
+    if summary_only:
+        for key in ('changes_tsv', 'added_gff3', 'removed_gff3', 'changed_gff3'):
+            del payload['outputs'][key]
+
     with open(path, 'w', encoding = 'utf-8') as jsonfile:
         json.dump(payload, jsonfile, indent = 2, sort_keys = True)
         jsonfile.write('\n')
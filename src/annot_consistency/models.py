@@ -8,6 +8,9 @@ EntityType = Literal["gene", "mRNA", "exon",
                       "rRNA", "snoRNA", "snRNA", "tRNA"]
 ChangeType = Literal["added", "removed", "changed"]
 
+# Entity types tracked by build_entities/diff_entity
+ENTITY_TYPES: tuple[EntityType, ...] = ("gene", "mRNA", "exon")
+
 #Dataclasses to be immutable
 @dataclass(frozen=True)
 class EntitySummary:
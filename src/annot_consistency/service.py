@@ -0,0 +1,299 @@
+# annot_consistency/service.py
+# Local comparison service: keeps recently used releases warm in memory and
+# answers diff requests over HTTP on localhost or a Unix socket.
+#
+#   GET  /releases                                   -> releases currently cached
+#   POST /diff  {"release_a": path, "release_b": path} -> summary counts + change records
+#
+# Release loading runs in a process pool (its result is shipped back once per
+# release); diffs run in a thread next to the warm entity maps, so the maps are
+# never pickled per request.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from annot_consistency.diff import build_entities, diff_entity
+from annot_consistency.gffutils_db import load_or_create_release_db
+from annot_consistency.io import CHANGES_COLUMNS, change_row, count_changes, ensure_outdir
+from annot_consistency.logging_utils import logger
+from annot_consistency.models import EntitySummary
+
+Entities = dict[str, dict[str, EntitySummary]]
+
+# Default DB directory: ~/app/gffacake/service
+default_db_dir = os.path.join(os.path.expanduser("~"), "app", "gffacake", "service")
+
+# Largest request body accepted (diff requests are two paths)
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Serve A vs B comparisons of warm releases")
+    p.add_argument("--host", default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8765, help="Port to bind (default: 8765)")
+    p.add_argument("--socket", help="Serve on this Unix socket instead of host/port")
+    p.add_argument("--db-dir", default=default_db_dir,
+                   help=f"Directory for release DBs and the log (default: {default_db_dir})")
+    p.add_argument("--max-entities", type=int, default=2_000_000,
+                   help="Memory budget of the release cache, in cached entities "
+                        "(default: 2000000)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Processes used for loading releases (default: CPU count)")
+    p.add_argument("--fast-ingest", action="store_true",
+                   help="Build new gffutils DBs with the fast-ingest profile")
+    return p.parse_args(argv)
+
+
+def release_key(release: Path) -> str:
+    '''
+    Identifies one version of a release file: resolved path, mtime and size, so an
+    edited or replaced file is loaded again instead of served from the cache
+    '''
+    stat = release.stat()
+    return f"{release}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def release_db_path(db_dir: str, release: Path) -> Path:
+    '''
+    Gives the DB path for a release; the hash of the resolved path keeps releases
+    with the same file name apart. An edited release is rebuilt into the same DB
+    (load_or_create_release_db checks the source mtime/size stored in it)
+    '''
+    digest = hashlib.sha1(str(release).encode("utf-8")).hexdigest()[:12]
+    return Path(db_dir) / f"{release.stem}_{digest}.db"
+
+
+def load_entities(release: str, db_path: str, fast_ingest: bool) -> Entities:
+    '''
+    Opens (or creates) the release DB and builds its entity map; runs in the process pool
+    '''
+    db = load_or_create_release_db(Path(release), Path(db_path), fast_ingest)
+    return build_entities(db)
+
+
+def diff_payload(a_entities: Entities, b_entities: Entities) -> dict[str, Any]:
+    '''
+    Diffs two entity maps and gives the JSON response body: the summary.tsv counts
+    and one record per changes.tsv row; runs in a worker thread of the service process
+    '''
+    changes, _, _, _ = diff_entity(a_entities, b_entities)
+    counts = count_changes(changes)
+    totals = {ct: sum(c[ct] for c in counts.values()) for ct in ('added', 'removed', 'changed')}
+    return {
+        'summary': counts,
+        'totals': totals,
+        'changes': [dict(zip(CHANGES_COLUMNS, change_row(c))) for c in changes],
+    }
+
+
+def content_length(headers: dict[str, str]) -> int | None:
+    '''
+    Gives the request body length from the Content-Length header (0 if absent),
+    or None if the header is not a non-negative integer
+    '''
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+
+def entity_count(entities: Entities) -> int:
+    return sum(len(by_id) for by_id in entities.values())
+
+
+class ReleaseCache:
+    '''
+    LRU of release entity maps, bounded by the total number of cached entities.
+    Concurrent requests for the same release share one load.
+    '''
+
+    def __init__(self, max_entities: int) -> None:
+        self.max_entities = max_entities
+        self._releases: OrderedDict[str, tuple[Entities, int]] = OrderedDict()
+        self._loading: dict[str, asyncio.Future[Entities]] = {}
+        self._size = 0
+
+    def releases(self) -> list[dict[str, Any]]:
+        return [{'release': key, 'entities': size} for key, (_, size) in self._releases.items()]
+
+    async def get(self, key: str, load: Callable[[], Awaitable[Entities]]) -> Entities:
+        '''
+        Gives the cached entity map for key, awaiting load() (a coroutine function) on a miss
+        '''
+        if key in self._releases:
+            self._releases.move_to_end(key)
+            return self._releases[key][0]
+
+        if key in self._loading:
+            loading = self._loading[key]
+            # wait() never cancels the shared load, even if this request is cancelled
+            await asyncio.wait([loading])
+            if loading.cancelled():
+                # the request running the load was cancelled; load it for this one
+                return await self.get(key, load)
+            return loading.result()
+
+        future: asyncio.Future[Entities] = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            entities = await load()
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()      # mark retrieved when no other request is waiting
+            raise
+        except BaseException:
+            # this request was cancelled; waiters see the cancelled future and retry
+            future.cancel()
+            raise
+        finally:
+            del self._loading[key]
+
+        self._put(key, entities)
+        future.set_result(entities)
+        return entities
+
+    def _put(self, key: str, entities: Entities) -> None:
+        size = entity_count(entities)
+        self._releases[key] = (entities, size)
+        self._size += size
+        # evict least recently used releases, always keeping the newest one
+        while self._size > self.max_entities and len(self._releases) > 1:
+            _, (_, old_size) = self._releases.popitem(last=False)
+            self._size -= old_size
+
+
+class ComparisonService:
+    '''
+    Handles HTTP requests; loads run in a process pool and diffs in a worker thread
+    so the event loop keeps serving other requests
+    '''
+
+    def __init__(self, db_dir: str, max_entities: int, pool: ProcessPoolExecutor,
+                 fast_ingest: bool = False) -> None:
+        self.db_dir = db_dir
+        self.cache = ReleaseCache(max_entities)
+        self.pool = pool
+        self.fast_ingest = fast_ingest
+        self.log = logger(os.path.join(db_dir, "gffacake-service.log"))
+
+    async def release(self, path: str) -> Entities:
+        release = Path(path).resolve()
+        if not release.is_file():
+            raise FileNotFoundError(f"release not found: {path}")
+        if release.suffix.lower() not in {".gff3", ".gff"}:
+            raise ValueError(f"release must be a .gff or .gff3 file, got: {release.name}")
+
+        key = release_key(release)
+
+        async def load() -> Entities:
+            self.log.info("Loading release %s", key)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.pool, load_entities, str(release),
+                str(release_db_path(self.db_dir, release)), self.fast_ingest)
+
+        return await self.cache.get(key, load)
+
+    async def diff(self, body: dict[str, Any]) -> dict[str, Any]:
+        release_a = body.get('release_a')
+        release_b = body.get('release_b')
+        if not isinstance(release_a, str) or not isinstance(release_b, str):
+            raise ValueError("request body needs release_a and release_b paths")
+
+        a_entities, b_entities = await asyncio.gather(
+            self.release(release_a), self.release(release_b))
+
+        self.log.info("Differentiating %s vs %s", release_a, release_b)
+        payload = await asyncio.to_thread(diff_payload, a_entities, b_entities)
+        payload['release_a'] = release_a
+        payload['release_b'] = release_b
+        return payload
+
+    async def route(self, method: str, path: str, body: bytes) -> tuple[int, Any]:
+        if method == 'GET' and path == '/releases':
+            return 200, {'releases': self.cache.releases()}
+        if method == 'POST' and path == '/diff':
+            try:
+                request = json.loads(body or b'{}')
+            except json.JSONDecodeError:
+                return 400, {'error': 'request body is not valid JSON'}
+            if not isinstance(request, dict):
+                return 400, {'error': 'request body must be a JSON object'}
+            try:
+                return 200, await self.diff(request)
+            except (FileNotFoundError, ValueError) as exc:
+                return 400, {'error': str(exc)}
+        return 404, {'error': f'no route for {method} {path}'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers: dict[str, str] = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = content_length(headers)
+            if len(request_line) < 2:
+                status, payload = 400, {'error': 'malformed request line'}
+            elif length is None:
+                status, payload = 400, {'error': 'invalid Content-Length header'}
+            elif length > MAX_BODY_BYTES:
+                status, payload = 413, {'error': 'request body too large'}
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self.route(request_line[0], request_line[1], body)
+        except Exception:
+            self.log.exception("Failed handling request")
+            status, payload = 500, {'error': 'internal error, see service log'}
+
+        data = json.dumps(payload).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                     'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(data)}\r\n'
+                     'Connection: close\r\n\r\n'.encode('latin-1') + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    ensure_outdir(args.db_dir)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        service = ComparisonService(args.db_dir, args.max_entities, pool, args.fast_ingest)
+        if args.socket:
+            server = await asyncio.start_unix_server(service.handle, path=args.socket)
+            service.log.info("Serving on unix socket %s", args.socket)
+        else:
+            server = await asyncio.start_server(service.handle, args.host, args.port)
+            service.log.info("Serving on http://%s:%d", args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
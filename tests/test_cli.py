@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from src.annot_consistency.cli import main
+
+FIXTURES = Path(__file__).parent.joinpath("fixture_releases")
+PREFIX = "release_A_release_B"
+
+
+def read_run_json(outdir: Path) -> dict[str, Any]:
+    with open(outdir / f"{PREFIX}_run.json", encoding="utf-8") as fh:
+        run: dict[str, Any] = json.load(fh)
+    return run
+
+
+def test_run_json_reports_skipped_seqids(tmp_path: Path) -> None:
+    chr3 = ('chr3\tfixture\tgene\t1\t20\t.\t+\t.\tID=gene9\n'
+            'chr3\tfixture\tmRNA\t1\t20\t.\t+\t.\tID=tx9;Parent=gene9\n')
+    release_a = tmp_path / "release_A.gff3"
+    release_b = tmp_path / "release_B.gff3"
+    release_a.write_text((FIXTURES / "release_A.gff3").read_text() + chr3)
+    release_b.write_text((FIXTURES / "release_B.gff3").read_text() + chr3)
+    outdir = tmp_path / "out"
+
+    main([str(release_a), str(release_b), str(outdir)])
+
+    assert read_run_json(outdir)['skipped_seqids'] == {'count': 1, 'seqids': ['chr3']}
+    log = (outdir / f"{PREFIX}_annot-consistency.log").read_text()
+    assert "Skipping 1 unchanged seqids" in log
+
+
+def test_summary_only_matches_full_run(tmp_path: Path) -> None:
+    release_a = str(FIXTURES / "release_A.gff3")
+    release_b = str(FIXTURES / "release_B.gff3")
+    full_dir = tmp_path / "full"
+    summary_dir = tmp_path / "summary"
+
+    main([release_a, release_b, str(full_dir)])
+    main(["--summary-only", release_a, release_b, str(summary_dir)])
+
+    summary_tsv = f"{PREFIX}_summary.tsv"
+    assert (summary_dir / summary_tsv).read_text() == (full_dir / summary_tsv).read_text()
+
+    skipped = ("changes.tsv", "added.gff3", "removed.gff3", "changed.gff3")
+    for name in skipped:
+        assert (full_dir / f"{PREFIX}_{name}").is_file()
+        assert not (summary_dir / f"{PREFIX}_{name}").exists()
+    assert (summary_dir / f"{PREFIX}_report.html").is_file()
+
+    full_run = read_run_json(full_dir)
+    summary_run = read_run_json(summary_dir)
+    assert full_run['summary_only'] is False
+    assert summary_run['summary_only'] is True
+    for key in ('changes_tsv', 'added_gff3', 'removed_gff3', 'changed_gff3'):
+        assert key in full_run['outputs']
+        assert key not in summary_run['outputs']
+    assert summary_run['outputs']['summary_tsv'] == summary_tsv
+
+    report = (summary_dir / f"{PREFIX}_report.html").read_text()
+    assert "Detailed changes" not in report
+    assert f"{PREFIX}_added.gff3" not in report
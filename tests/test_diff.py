@@ -0,0 +1,112 @@
+from pathlib import Path
+
+from gffutils import FeatureDB
+
+from src.annot_consistency.diff import (
+    build_entities,
+    build_signatures,
+    count_diff,
+    diff_entity,
+    unchanged_subtrees,
+)
+from src.annot_consistency.gffutils_db import (
+    ensure_digests,
+    load_or_create_db,
+)
+from src.annot_consistency.io import count_changes
+
+CHR2 = ('chr2\tfixture\tgene\t1\t20\t.\t-\t.\tID=gene2\n'
+        'chr2\tfixture\tmRNA\t1\t20\t.\t-\t.\tID=tx2;Parent=gene2\n'
+        'chr2\tfixture\texon\t1\t10\t.\t-\t.\tID=tx2_ex1;Parent=tx2\n')
+
+
+def make_dbs(tmp_path: Path, chr1_a: str, chr1_b: str) -> tuple[FeatureDB, FeatureDB]:
+    gff_a = tmp_path.joinpath("a.gff3")
+    gff_b = tmp_path.joinpath("b.gff3")
+    gff_a.write_text('##gff-version 3\n' + chr1_a + CHR2)
+    gff_b.write_text('##gff-version 3\n' + chr1_b + CHR2)
+    return load_or_create_db(gff_a, gff_b, tmp_path.joinpath("a.db"), tmp_path.joinpath("b.db"))
+
+
+def test_unchanged_seqid_is_skipped(tmp_path: Path) -> None:
+    db_a, db_b = make_dbs(
+        tmp_path,
+        'chr1\tfixture\tgene\t5\t80\t.\t+\t.\tID=gene1\n'
+        'chr1\tfixture\texon\t5\t20\t.\t+\t.\tID=tx1_ex1;Parent=tx1\n',
+        'chr1\tfixture\tgene\t6\t80\t.\t+\t.\tID=gene1\n'
+        'chr1\tfixture\texon\t5\t20\t.\t+\t.\tID=tx1_ex1;Parent=tx1\n')
+
+    skip, skipped_seqids = unchanged_subtrees(ensure_digests(db_a)[0], ensure_digests(db_b)[0])
+
+    assert skipped_seqids == ['chr2']
+    assert ('chr1', 'exon') in skip
+    assert ('chr1', 'gene') not in skip
+
+    a_entities = build_entities(db_a, skip)
+    assert list(a_entities['gene']) == ['gene1']
+    assert a_entities['mRNA'] == {}
+
+    changes, _, _, _ = diff_entity(a_entities, build_entities(db_b, skip))
+    full_changes, _, _, _ = diff_entity(build_entities(db_a), build_entities(db_b))
+    assert changes == full_changes
+    assert [(c.entity_id, c.change_type) for c in changes] == [('gene1', 'changed')]
+
+
+
+def test_ids_on_several_seqids_are_never_skipped(tmp_path: Path) -> None:
+    # PAR-style gene: the same ID on chrX and chrY; B only changes the chrX copy
+    par_y = 'chrY\tfixture\tgene\t1\t100\t.\t+\t.\tID=PAR1\n'
+    db_a, db_b = make_dbs(tmp_path,
+                          'chrX\tfixture\tgene\t1\t100\t.\t+\t.\tID=PAR1\n' + par_y,
+                          'chrX\tfixture\tgene\t2\t100\t.\t+\t.\tID=PAR1\n' + par_y)
+
+    digests_a, shared_a = ensure_digests(db_a)
+    digests_b, shared_b = ensure_digests(db_b)
+    shared = shared_a | shared_b
+    skip, skipped_seqids = unchanged_subtrees(digests_a, digests_b, shared)
+
+    assert shared == {('chrX', 'gene'), ('chrY', 'gene')}
+    assert skipped_seqids == ['chr2']
+    assert ('chrY', 'gene') not in skip
+
+    changes, _, _, _ = diff_entity(build_entities(db_a, skip), build_entities(db_b, skip))
+    full_changes, _, _, _ = diff_entity(build_entities(db_a), build_entities(db_b))
+    assert count_changes(changes) == count_changes(full_changes) == {}
+
+
+def test_count_diff_keeps_last_copy_like_build_entities(tmp_path: Path) -> None:
+    # duplicated ID on one seqid, listed out of start order; B changes only the first copy
+    late = 'chr1\tfixture\tgene\t50\t60\t.\t+\t.\tID=DUP\n'
+    db_a, db_b = make_dbs(tmp_path,
+                          late + 'chr1\tfixture\tgene\t1\t10\t.\t+\t.\tID=DUP\n',
+                          late + 'chr1\tfixture\tgene\t1\t12\t.\t+\t.\tID=DUP\n')
+
+    changes, _, _, _ = diff_entity(build_entities(db_a), build_entities(db_b))
+
+    assert count_diff(build_signatures(db_a), build_signatures(db_b)) == count_changes(changes)
+    # skipping the unchanged chr2 keeps the same copy of DUP
+    skip, _ = unchanged_subtrees(ensure_digests(db_a)[0], ensure_digests(db_b)[0])
+    assert ('chr2', 'gene') in skip
+    assert build_entities(db_a, skip)['gene'] == {'DUP': build_entities(db_a)['gene']['DUP']}
+
+
+def test_digests_are_stored_in_db(tmp_path: Path) -> None:
+    db_a, _ = make_dbs(tmp_path, '', '')
+
+    stored = list(db_a.execute("SELECT seqid, featuretype FROM gffacake_digests"))
+
+    assert sorted(tuple(row) for row in stored) == [
+        ('chr2', 'exon'), ('chr2', 'gene'), ('chr2', 'mRNA')]
+
+
+def test_count_diff_matches_change_records(tmp_path: Path) -> None:
+    fixtures = Path(__file__).parent.joinpath("fixture_releases")
+    db_a, db_b = load_or_create_db(fixtures / "release_A.gff3", fixtures / "release_B.gff3",
+                                   tmp_path.joinpath("a.db"), tmp_path.joinpath("b.db"))
+
+    changes, _, _, _ = diff_entity(build_entities(db_a), build_entities(db_b))
+
+    assert count_diff(build_signatures(db_a), build_signatures(db_b)) == count_changes(changes)
+    assert build_signatures(db_b) == {
+        et: {e_id: e.signature() for e_id, e in by_id.items()}
+        for et, by_id in build_entities(db_b).items()}
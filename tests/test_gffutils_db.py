@@ -1,8 +1,20 @@
+import logging
+import multiprocessing
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any
 
 from gffutils import FeatureDB
 
-from src.annot_consistency.gffutils_db import load_or_create_db
+from src.annot_consistency.diff import build_entities
+from src.annot_consistency.gffutils_db import (
+    is_complete,
+    load_or_create_db,
+    load_or_create_release_db,
+)
+
+FIXTURE_B = Path(__file__).parent.joinpath("fixture_releases", "release_B.gff3")
 
 
 def test_create_and_check_db(tmp_path: Path) -> None:
@@ -25,3 +37,73 @@ def test_create_and_check_db(tmp_path: Path) -> None:
     assert len(list(db_2.features_of_type("mRNA"))) == 1
 
 
+def test_fast_ingest_matches_default(tmp_path: Path) -> None:
+    db_path_default = tmp_path.joinpath("default.db")
+    db_path_fast = tmp_path.joinpath("fast.db")
+
+    db_default, _ = load_or_create_db(FIXTURE_B, FIXTURE_B, db_path_default, db_path_default)
+    db_fast, _ = load_or_create_db(FIXTURE_B, FIXTURE_B, db_path_fast, db_path_fast,
+                                   fast_ingest=True)
+
+    assert isinstance(db_fast, FeatureDB)
+    assert db_path_fast.is_file()
+    assert build_entities(db_fast) == build_entities(db_default)
+    # relations are never read by the diff, so the fast profile drops them
+    assert list(db_fast.execute("SELECT * FROM relations")) == []
+
+
+def test_partial_db_is_rebuilt(tmp_path: Path) -> None:
+    db_path = tmp_path.joinpath("partial.db")
+    # a DB another job is still writing: valid sqlite but no completeness marker
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE features (id TEXT)")
+    conn.commit()
+    conn.close()
+    assert not is_complete(db_path)
+
+    db = load_or_create_release_db(FIXTURE_B, db_path)
+
+    assert is_complete(db_path)
+    assert len(list(db.features_of_type("gene"))) == 3
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+class RecordMessages(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+def build_in_job(db_path: Path, barrier: Any) -> tuple[int, list[str]]:
+    handler = RecordMessages()
+    log = logging.getLogger("gffACAKE")
+    log.setLevel(logging.INFO)
+    log.addHandler(handler)
+    barrier.wait()      # start all jobs together so they race for the DB
+    try:
+        db = load_or_create_release_db(FIXTURE_B, db_path)
+    finally:
+        log.removeHandler(handler)
+    return len(list(db.features_of_type("exon"))), handler.messages
+
+
+def test_concurrent_jobs_share_one_build(tmp_path: Path) -> None:
+    db_path = tmp_path.joinpath("shared.db")
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=4) as pool:
+        barrier = manager.Barrier(4)
+        results = list(pool.map(build_in_job, [db_path] * 4, [barrier] * 4))
+
+    messages = [m for _, job_messages in results for m in job_messages]
+    builds = [m for m in messages if m.startswith("Building DB")]
+    reuses = [m for m in messages if m.startswith("Reusing DB built by another job")]
+
+    assert [count for count, _ in results] == [5, 5, 5, 5]
+    assert len(builds) == 1
+    # the other jobs either waited for the lock and reused the DB, or found it complete
+    assert len(reuses) <= 3
+    assert is_complete(db_path)
+    assert list(tmp_path.glob("*.tmp")) == []
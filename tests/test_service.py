@@ -0,0 +1,113 @@
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from src.annot_consistency.service import ComparisonService, ReleaseCache
+
+FIXTURES = Path(__file__).parent.joinpath("fixture_releases")
+
+
+def test_release_cache_evicts_least_recently_used() -> None:
+    cache = ReleaseCache(max_entities=3)
+
+    async def run() -> list[str]:
+        for key in ('a', 'b', 'a', 'c'):
+            async def load(key: str = key) -> dict[str, dict[str, Any]]:
+                ids = [f'{key}1', f'{key}2'] if key == 'c' else [f'{key}1']
+                return {'gene': {i: key for i in ids}}
+            await cache.get(key, load)
+        return [r['release'] for r in cache.releases()]
+
+    # a (1) + b (1) + c (2) > 3, so b is evicted: a was used more recently
+    assert asyncio.run(run()) == ['a', 'c']
+
+
+def test_cancelled_load_does_not_hang_waiters() -> None:
+    cache = ReleaseCache(max_entities=10)
+
+    async def run() -> dict[str, dict[str, Any]]:
+        started = asyncio.Event()
+
+        async def stuck_load() -> dict[str, dict[str, Any]]:
+            started.set()
+            await asyncio.Event().wait()
+            return {}
+
+        async def load() -> dict[str, dict[str, Any]]:
+            return {'gene': {'g1': 'a'}}
+
+        first = asyncio.create_task(cache.get('a', stuck_load))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get('a', load))
+        await asyncio.sleep(0)
+        first.cancel()
+        # the waiter loads the release itself instead of waiting forever
+        return await asyncio.wait_for(waiter, timeout=5)
+
+    assert asyncio.run(run()) == {'gene': {'g1': 'a'}}
+
+
+def test_diff_request_returns_counts_and_changes(tmp_path: Path) -> None:
+    body = json.dumps({'release_a': str(FIXTURES / 'release_A.gff3'),
+                       'release_b': str(FIXTURES / 'release_B.gff3')}).encode()
+
+    async def run() -> tuple[int, Any]:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            service = ComparisonService(str(tmp_path), 1000, pool)
+            return await service.route('POST', '/diff', body)
+
+    status, payload = asyncio.run(run())
+
+    assert status == 200
+    assert payload['summary']['exon'] == {'added': 1, 'removed': 1, 'changed': 1}
+    assert payload['totals'] == {'added': 3, 'removed': 1, 'changed': 3}
+    assert len(payload['changes']) == 7
+    assert set(payload['changes'][0]) == {'Entity_Type', 'Entity_ID', 'Change_Type', 'Details'}
+
+
+def test_rewritten_release_is_reloaded(tmp_path: Path) -> None:
+    release_a = tmp_path.joinpath('release_A.gff3')
+    release_b = tmp_path.joinpath('release_B.gff3')
+    release_a.write_text((FIXTURES / 'release_A.gff3').read_text())
+    release_b.write_text((FIXTURES / 'release_A.gff3').read_text())
+    body = json.dumps({'release_a': str(release_a), 'release_b': str(release_b)}).encode()
+
+    async def run() -> tuple[Any, Any]:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            service = ComparisonService(str(tmp_path), 1000, pool)
+            _, before = await service.route('POST', '/diff', body)
+            # a curator replaces release B with new content
+            release_b.write_text((FIXTURES / 'release_B.gff3').read_text())
+            _, after = await service.route('POST', '/diff', body)
+            return before, after
+
+    before, after = asyncio.run(run())
+
+    assert before['totals'] == {'added': 0, 'removed': 0, 'changed': 0}
+    assert after['totals'] == {'added': 3, 'removed': 1, 'changed': 3}
+    # the rewrite replaced release B's DB instead of adding one next to it
+    assert len(list(tmp_path.glob('release_B_*.db'))) == 1
+    assert len(list(tmp_path.glob('release_B_*.db.lock'))) == 1
+
+
+def test_bad_content_length_is_rejected(tmp_path: Path) -> None:
+    async def request(content_length: str) -> bytes:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            service = ComparisonService(str(tmp_path), 1000, pool)
+            server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(f'POST /diff HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n'
+                             .encode('latin-1'))
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+                return response
+
+    for content_length in ('abc', '-1'):
+        response = asyncio.run(request(content_length))
+        assert response.startswith(b'HTTP/1.1 400 Bad Request\r\n')
+        assert b'invalid Content-Length header' in response